@@ -1,5 +1,7 @@
+echo "Pre-trimming music as FLAC for the exe"
+SOLAR_RIFT_CACHE_FORMAT=flac SDL_AUDIODRIVER=dummy python3 -c "import solar_rift_music_player as m; m.AreaMusicPlayer()"
 echo "Building exe"
-pyinstaller -F --add-data pre-trimmed:pre-trimmed solar_rift_music_player.py
+pyinstaller -F --add-data "pre-trimmed/*.flac:pre-trimmed" --add-data pre-trimmed/manifest.json:pre-trimmed solar_rift_music_player.py
 echo "Cleaning up exe build residue"
 rm -rf build
 rm *.spec
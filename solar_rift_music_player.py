@@ -9,16 +9,29 @@ See https://creativecommons.org/licenses/by/4.0/ for details.
 S.D.G.
 """
 
-import glob
+from concurrent.futures import ProcessPoolExecutor
+import json
+import logging
+import multiprocessing
 import os
+import sys
+import time
 import tkinter as tk
 from tkinter import ttk
-import pydub
-from pygame import mixer
+import numpy as np
+from pygame import mixer, sndarray
+import soundfile as sf
+
+# Diagnostics are quiet unless asked for, e.g. SOLAR_RIFT_LOG=DEBUG
+LOG_LEVEL = os.environ.get("SOLAR_RIFT_LOG", "WARNING").upper()
+if not isinstance(logging.getLevelName(LOG_LEVEL), int):
+    LOG_LEVEL = "WARNING"
+logging.basicConfig(level=LOG_LEVEL)
+log = logging.getLogger(__name__)
 
 # OST save location
-OST_PATH = __file__[:__file__.rfind(os.sep)]
-print(OST_PATH)
+OST_PATH = os.path.dirname(os.path.abspath(__file__))
+log.debug(OST_PATH)
 
 # Period of silence at the beginning and end of each track set, in seconds
 TRIM_VALUES = {
@@ -27,9 +40,29 @@ TRIM_VALUES = {
     "Pyre": (0.1, 0.031),
     }
 
-# The loudest we can set a sound volume to
+# Wether to find the silence at each end of the tracks instead of using
+# TRIM_VALUES, turned on with SOLAR_RIFT_AUTO_TRIM=1
+AUTO_TRIM = os.environ.get("SOLAR_RIFT_AUTO_TRIM", "0") == "1"
+
+# Samples quieter than this (out of 32767) count as silence for auto trimming.
+# Calibrated against TRIM_VALUES: the leads land within 2ms of them, but the
+# tails only roughly, since the tracks fade out instead of cutting off,
+# so auto trimming is approximate.
+SILENCE_THRESHOLD = 900
+
+# How far auto trimming can stray from TRIM_VALUES before we warn, in seconds
+AUTO_TRIM_TOLERANCE = 0.005
+
+# The loudest any one track plays at, mixed into the pre-trimmed blends
 MAX_AUDIO_VOL = 0.5
 
+# Samples per mixer buffer. Smaller means less delay when the music changes,
+# but raise it (e.g. to 4096) if the audio crackles on slower hardware
+MIXER_BUFFER = 1024
+
+# How long to fade the music in and out when changing areas, in milliseconds
+FADE_MS = 150
+
 # The highest level of danger on the scale
 MAX_DANGER_LEVEL = 100
 
@@ -39,29 +72,440 @@ GAME_AREA_NAMES = list(TRIM_VALUES.keys())
 # The filename extension of the music files
 MUSIC_SUFFIX = ".mp3"
 
+# libsndfile older than 1.1.0 cannot read MP3, so PyDub has to decode them
+SOUNDFILE_READS_MP3 = "MP3" in sf.available_formats()
+
+# The file format to save the pre-trimmed music in, "npy", "wav", or "flac",
+# chosen with SOLAR_RIFT_CACHE_FORMAT. NPY is raw samples that get
+# memory-mapped with no parsing at all, and WAV can be opened by other
+# programs, but both are uncompressed. FLAC is less than half the size but
+# has to be decoded on every launch, so the exe bundles it.
+CACHE_FORMATS = ("npy", "wav", "flac")
+CACHE_FORMAT = os.environ.get("SOLAR_RIFT_CACHE_FORMAT", "npy").lower()
+if CACHE_FORMAT not in CACHE_FORMATS:
+    CACHE_FORMAT = "npy"
+
 # The folder to put/load pre-trimmed music in
 PRE_TRIMMED_FOLDERNAME = "pre-trimmed"
 PRE_TRIMMED_FOLDER = os.path.join(OST_PATH, PRE_TRIMMED_FOLDERNAME)
 
-# Wether or not trimming has already been performed
-PRE_TRIMMED = os.path.exists(PRE_TRIMMED_FOLDER)
+# Record of what each area's pre-trimmed blends were made from
+MANIFEST_PATH = os.path.join(PRE_TRIMMED_FOLDER, "manifest.json")
+
+
+def _load_manifest():
+    """Load the record of what the pre-trimmed blends were made from
+
+    Returns:
+        manifest (dict): Blend records keyed by area name,
+            empty if there is no readable manifest.
+    """
+
+    try:
+        with open(MANIFEST_PATH) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_manifest():
+    """Write the record of what the pre-trimmed blends were made from"""
+    os.makedirs(PRE_TRIMMED_FOLDER, exist_ok = True)
+    with open(MANIFEST_PATH, "w") as f:
+        json.dump(MANIFEST, f, indent=4)
+
+
+def _pre_blended_path(an, k, cache_format=None):
+    """Get the path of one of an area's pre-trimmed blends
+
+    Args:
+        an (str): The area name.
+        k (int): How many tracks above the base one are mixed in.
+        cache_format (str): The file format of the blend.
+            Defaults to CACHE_FORMAT.
+
+    Returns:
+        path (str): Where the blend should be.
+    """
+
+    return os.path.join(PRE_TRIMMED_FOLDER, f"{an} blend {k}.{cache_format or CACHE_FORMAT}")
+
+
+def _blend_record(an):
+    """Describe what an area's pre-trimmed blends get made from
+
+    Args:
+        an (str): The area name.
+
+    Returns:
+        record (dict): The manifest entry for the area.
+    """
+
+    return {
+        "sources": {fn: os.path.getmtime(AUDIO_PATHS[fn]) for fn in AREA_FNS[an]},
+        "trim": ["auto", SILENCE_THRESHOLD] if AUTO_TRIM else list(TRIM_VALUES[an]),
+        "format": [MIXER_FREQUENCY, MIXER_CHANNELS],
+        "volume": MAX_AUDIO_VOL,
+        "cache": CACHE_FORMAT,
+        }
+
+
+def _is_pre_blended(an):
+    """Check if an area has up-to-date pre-trimmed blends
+
+    Args:
+        an (str): The area name.
+
+    Returns:
+        fresh (bool): Wether the blends can be used as-is.
+    """
+
+    if not all(os.path.exists(_pre_blended_path(an, k)) for k in range(len(AREA_FNS[an]))):
+        return False
+
+    # Without the originals (e.g. in the exe), there is nothing to compare with
+    if not all(os.path.exists(AUDIO_PATHS[fn]) for fn in AREA_FNS[an]):
+        return True
+
+    return MANIFEST.get(an) == _blend_record(an)
+
+
+def _probe_format():
+    """Get the sample rate and channel count of the first track, without
+        decoding it, so that the mixer can match the music
+
+    Returns:
+        frequency (int): The sample rate to start the mixer with.
+        channels (int): The number of channels to start the mixer with.
+    """
+
+    # Nothing to match
+    if not AUDIO_FNS:
+        return 44100, 2
+
+    # Without the original, use the format the blends were made in
+    path = AUDIO_PATHS[AUDIO_FNS[0]]
+    if not os.path.exists(path):
+        for record in MANIFEST.values():
+            if "format" in record:
+                return tuple(record["format"])
+
+        return 44100, 2
+
+    # Nothing to read the header with, so PyDub converts to the default
+    if not SOUNDFILE_READS_MP3:
+        return 44100, 2
+
+    info = sf.info(path)
+    return info.samplerate, info.channels
+
+
+MANIFEST = _load_manifest()
 
 # Get all the filenames of the OST mp3s
-if PRE_TRIMMED:
-    print("Looking for pre-trimmed MP3s")
-    aafs = glob.glob("*" + MUSIC_SUFFIX, root_dir=PRE_TRIMMED_FOLDER)
-else:
-    print("Looking for renamed original MP3s")
-    aafs = glob.glob("*" + MUSIC_SUFFIX, root_dir=OST_PATH)
+log.debug("Looking for renamed original MP3s")
+with os.scandir(OST_PATH) as entries:
+    # Skip hidden files like macOS resource forks, and match the suffix in any case
+    aafs = [
+        e.name for e in entries
+        if not e.name.startswith(".")
+        and e.name.lower().endswith(MUSIC_SUFFIX)
+        and e.is_file()
+        ]
+if not aafs:
+    # The originals are not bundled with the exe, so go off of the manifest
+    log.debug("Looking for pre-trimmed blends")
+    aafs = list({fn for record in MANIFEST.values() for fn in record.get("sources", ())})
 aafs.sort()  # Files may not be in order if we are in temp exe storage
 
-# Get only related files
-AUDIO_FNS = [fn for fn in aafs if True in [area in fn for area in GAME_AREA_NAMES]]
-for fn in AUDIO_FNS:
-    print(os.path.join(OST_PATH, fn))
+# Get only related files, grouped by each area name they contain,
+# and the path of each original
+AUDIO_FNS = []
+AREA_FNS = {an: [] for an in GAME_AREA_NAMES}
+AUDIO_PATHS = {}
+for fn in aafs:
+    for an in GAME_AREA_NAMES:
+        if an in fn:
+            AREA_FNS[an].append(fn)
+
+            if fn not in AUDIO_PATHS:
+                AUDIO_FNS.append(fn)
+                AUDIO_PATHS[fn] = os.path.join(OST_PATH, fn)
+                log.debug(AUDIO_PATHS[fn])
+
+# Without the originals (e.g. in the exe) no blends can be made, so load
+# them in whatever format they were made in
+if not any(os.path.exists(path) for path in AUDIO_PATHS.values()):
+    for record in MANIFEST.values():
+        if "cache" in record:
+            CACHE_FORMAT = record["cache"]
+            break
+
+# The format to run the mixer in, and so to save the pre-trimmed blends in
+MIXER_FREQUENCY, MIXER_CHANNELS = _probe_format()
+
+# Areas that still need their tracks trimmed and blended
+UNBLENDED = [an for an in GAME_AREA_NAMES if not _is_pre_blended(an)]
+
+# Files that still need to be trimmed, with the area names to trim them for
+UNTRIMMED = {}
+for an in UNBLENDED:
+    for fn in AREA_FNS[an]:
+        UNTRIMMED.setdefault(fn, []).append(an)
+
+# Wether or not trimming has already been performed for every area
+PRE_TRIMMED = not UNBLENDED
+
+
+def _decode_with_soundfile(path, lead, tail, frequency, channels):
+    """Decode only the kept part of an audio file straight into a
+        preallocated sample buffer, using libsndfile.
+
+    Args:
+        path (str): The audio file to decode.
+        lead (float): Seconds of silence to skip at the beginning.
+        tail (float): Seconds of silence to skip at the end.
+        frequency (int): The sample rate the mixer wants.
+        channels (int): The number of channels the mixer wants.
+
+    Returns:
+        pcm (numpy.ndarray): The trimmed 16 bit samples, one row per frame,
+            or None if the file would need converting to fit the mixer.
+    """
+
+    with sf.SoundFile(path) as f:
+        # libsndfile cannot resample or remix, so leave that to PyDub
+        if (f.samplerate, f.channels) != (frequency, channels):
+            return None
+
+        start = round(lead * f.samplerate)
+        end = f.frames - round(tail * f.samplerate)
+        f.seek(start)
+        pcm = np.empty((end - start, f.channels), dtype=np.int16)
+        f.read(out=pcm)
+
+    return pcm
+
+
+def _decode_with_pydub(path, lead, tail, frequency, channels):
+    """Decode and trim an audio file using PyDub and FFmpeg,
+        converting it to fit the mixer.
+
+    Args:
+        path (str): The audio file to decode.
+        lead (float): Seconds of silence to skip at the beginning.
+        tail (float): Seconds of silence to skip at the end.
+        frequency (int): The sample rate the mixer wants.
+        channels (int): The number of channels the mixer wants.
+
+    Returns:
+        pcm (numpy.ndarray): The trimmed 16 bit samples, one row per frame.
+    """
+
+    # PyDub (and with it FFmpeg) is only needed as a fallback
+    import pydub
+
+    # Load all the audio into PyDub
+    pds = pydub.AudioSegment.from_file(path)
+
+    # Trim off the silence for the area, counting the tail from the end
+    # so that a zero tail keeps it all
+    pds = pds[lead * 1000: len(pds) - tail * 1000]
+
+    # Match the mixer, so the raw samples can be played as-is
+    pds = pds.set_frame_rate(frequency).set_channels(channels).set_sample_width(2)
+
+    return np.frombuffer(pds.raw_data, dtype=np.int16).reshape(-1, channels)
+
+
+def _trim_values(an):
+    """Get how much to trim off of each file of an area while decoding it
+
+    Args:
+        an (str): The area name.
+
+    Returns:
+        lead (float): Seconds to trim off of the beginning.
+        tail (float): Seconds to trim off of the end.
+    """
+
+    # Auto trimming happens after decoding, on all of the area's tracks at once
+    if AUTO_TRIM:
+        return 0, 0
+
+    return TRIM_VALUES[an]
+
+
+def _find_silence_edges(tracks, threshold):
+    """Find the silence that all of an area's tracks have at each end, so
+        that they can be trimmed alike and stay in time
+
+    Args:
+        tracks (list): The tracks of the area, as raw samples.
+        threshold (int): Samples no louder than this count as silence.
+
+    Returns:
+        lead (int): Frames of silence at the beginning.
+        tail (int): Frames of silence at the end, counting from the end of
+            the shortest track.
+    """
+
+    length = min(len(track) for track in tracks)
 
-# Start PyGame Mixer
-mixer.init()
+    # Frames where any channel of any track is above the threshold. Comparing
+    # both ways avoids np.abs overflowing on -32768.
+    loud = np.zeros(length, dtype=bool)
+    for track in tracks:
+        track = track[:length]
+        loud |= ((track > threshold) | (track < -threshold)).any(axis=1)
+
+    loud_frames = np.flatnonzero(loud)
+
+    # All silence, so nothing to go by
+    if not len(loud_frames):
+        return 0, 0
+
+    return int(loud_frames[0]), int(length - 1 - loud_frames[-1])
+
+
+def _trim_track(fn, ans):
+    """Trim the silence off of a music file for each area it belongs to,
+        in the mixer format, decoding it only once. Runs in a worker process,
+        so only takes picklable args.
+
+    Args:
+        fn (str): The filename to trim.
+        ans (list): The area names to trim the file for.
+
+    Returns:
+        pcms (list): The trimmed audio for each area, as raw samples in the
+            mixer format.
+    """
+
+    log.debug("Performing trim on %s", fn)
+    untrimmed_path = AUDIO_PATHS[fn]
+    mixer_format = MIXER_FREQUENCY, MIXER_CHANNELS
+
+    # Decode enough to cover what every one of the areas keeps
+    lead = min(_trim_values(an)[0] for an in ans)
+    tail = min(_trim_values(an)[1] for an in ans)
+
+    pcm = None
+    if SOUNDFILE_READS_MP3:
+        pcm = _decode_with_soundfile(untrimmed_path, lead, tail, *mixer_format)
+
+    # Convert the file with PyDub if libsndfile cannot do it as-is
+    if pcm is None:
+        pcm = _decode_with_pydub(untrimmed_path, lead, tail, *mixer_format)
+
+    # Trim the rest off for each area as a view, without copying
+    start = round(lead * MIXER_FREQUENCY)
+    end = round(tail * MIXER_FREQUENCY)
+    return [
+        pcm[
+            round(_trim_values(an)[0] * MIXER_FREQUENCY) - start:
+            len(pcm) - (round(_trim_values(an)[1] * MIXER_FREQUENCY) - end)
+            ]
+        for an in ans
+        ]
+
+
+def _blend_to_disk(an, tracks):
+    """Pre-mix an area's trimmed tracks into cumulative blends, and save them
+        to the pre-trimmed location. Blend k is the base track with the next
+        k tracks mixed in, so any danger level is a crossfade of two blends.
+
+    Args:
+        an (str): The area name.
+        tracks (list): The trimmed tracks of the area, as raw samples.
+
+    Returns:
+        blends (list): The blends, as raw samples in the mixer format.
+    """
+
+    log.debug("Blending %s", an)
+
+    if AUTO_TRIM:
+        lead, tail = _find_silence_edges(tracks, SILENCE_THRESHOLD)
+        log.debug(
+            "Found %.3fs and %.3fs of silence in %s",
+            lead / MIXER_FREQUENCY,
+            tail / MIXER_FREQUENCY,
+            an,
+            )
+
+        # Check the found silence against the tuned values
+        for found, tuned, edge in zip((lead, tail), TRIM_VALUES[an], ("lead", "tail")):
+            off = found / MIXER_FREQUENCY - tuned
+            if abs(off) > AUTO_TRIM_TOLERANCE:
+                log.warning(
+                    "Auto trim of %s is %+.1fms from the tuned %s, so it may not loop"
+                    " cleanly",
+                    an,
+                    off * 1000,
+                    edge,
+                    )
+
+        end = min(len(track) for track in tracks) - tail
+        tracks = [track[lead:end] for track in tracks]
+
+    # Cut all the tracks to the same length, so the blends loop together
+    length = min(len(track) for track in tracks)
+
+    blends = []
+    mix = np.zeros((length, MIXER_CHANNELS), dtype=np.int32)
+    for k, track in enumerate(tracks):
+        mix += track[:length]
+        blend = np.clip(mix * MAX_AUDIO_VOL, -32768, 32767).astype(np.int16)
+
+        # Save the blend to the pre-trimmed location
+        os.makedirs(PRE_TRIMMED_FOLDER, exist_ok = True)
+        if CACHE_FORMAT == "npy":
+            np.save(_pre_blended_path(an, k), blend)
+        else:
+            sf.write(_pre_blended_path(an, k), blend, MIXER_FREQUENCY, subtype="PCM_16")
+        blends.append(blend)
+
+        # Don't leave a stale copy of the blend behind in another format
+        for cache_format in CACHE_FORMATS:
+            stale_path = _pre_blended_path(an, k, cache_format)
+            if cache_format != CACHE_FORMAT and os.path.exists(stale_path):
+                os.remove(stale_path)
+
+    return blends
+
+
+def _ensure_mixer():
+    """Start PyGame Mixer if it is not running yet"""
+    if mixer.get_init():
+        return
+
+    # 16 bit, since that is what the tracks get trimmed to. Any conversion
+    # for the audio device is left to SDL, so the samples always fit as-is.
+    mixer.pre_init(
+        frequency=MIXER_FREQUENCY,
+        size=-16,
+        channels=MIXER_CHANNELS,
+        buffer=MIXER_BUFFER,
+        )
+    mixer.init(allowedchanges=0)
+
+
+def _make_sound(pcm):
+    """Load raw samples into PyGame
+
+    Args:
+        pcm (numpy.ndarray): The samples in the mixer format, one row per frame.
+
+    Returns:
+        sound (pygame.mixer.Sound): The sound.
+    """
+
+    # A mono mixer only takes a flat array of samples
+    if MIXER_CHANNELS == 1:
+        pcm = np.ascontiguousarray(pcm[:, 0])
+
+    return sndarray.make_sound(pcm)
 
 
 class AreaMusicPlayer:
@@ -70,73 +514,141 @@ class AreaMusicPlayer:
     def __init__(self):
         """Handle looping and danger levels of area music"""
 
-        # Get and load the tracks that are associated with an area
-        if PRE_TRIMMED:
-            print("Loading pre-trimmed files")
-        else:
-            print("Loading and trimming files")
-
-        self.game_area_tracks = {
-            # For each area name
-            an: [
-                # Load the sound in PyGame Mixer after trimming off the silence
-                self.load_trimmed(fn, an)
-                # If the sound filename contains the area name
-                for fn in AUDIO_FNS if an in fn
+        start_time = time.perf_counter()
+
+        # Freshly trimmed audio, by filename and area name
+        trimmed = {}
+
+        # Blends made straight from freshly trimmed audio, by area name
+        fresh_blends = {}
+
+        # Trim all the files that need it at once, one process each
+        if not PRE_TRIMMED:
+            log.debug("Trimming files")
+
+            # No more workers than files, and Windows cannot wait on more than 61
+            workers = max(1, min(len(UNTRIMMED), os.cpu_count() or 1))
+            if sys.platform == "win32":
+                workers = min(workers, 61)
+
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                results = executor.map(_trim_track, UNTRIMMED.keys(), UNTRIMMED.values())
+                for (fn, ans), pcms in zip(UNTRIMMED.items(), results):
+                    for an, pcm in zip(ans, pcms):
+                        trimmed[fn, an] = pcm
+
+        # The mixer is needed from here on, but idles on a whole CPU core, so
+        # it only gets started once the workers are done, which also keeps
+        # them from being forked with its audio thread running
+        _ensure_mixer()
+
+        # Pre-mix the trimmed tracks of each area that needs it
+        for an in UNBLENDED:
+            tracks = [trimmed[fn, an] for fn in AREA_FNS[an]]
+
+            # No need to read back the files we just wrote
+            fresh_blends[an] = [_make_sound(blend) for blend in _blend_to_disk(an, tracks)]
+            MANIFEST[an] = _blend_record(an)
+
+        # Remember what the new pre-trimmed blends were made from
+        if not PRE_TRIMMED:
+            _save_manifest()
+
+        # Get and load the blends of each area
+        log.debug("Loading pre-trimmed blends")
+        self.game_area_blends = {
+            # Use the fresh blends, or load the already made ones
+            an: fresh_blends[an] if an in fresh_blends else [
+                self.load_blend(an, k) for k in range(len(fns))
+                ]
+            for an, fns in AREA_FNS.items()
+            }
+        log.info(
+            "Loaded %d blends in %.2fs",
+            sum(len(blends) for blends in self.game_area_blends.values()),
+            time.perf_counter() - start_time,
+            )
+
+        # Give every blend a channel of its own, so playing never has to look
+        # for a free one, and one area can fade out while another fades in
+        mixer.set_num_channels(sum(len(blends) for blends in self.game_area_blends.values()))
+        self.__area_channels = {}
+        channel_count = 0
+        for an, blends in self.game_area_blends.items():
+            self.__area_channels[an] = [
+                mixer.Channel(channel_count + k) for k in range(len(blends))
                 ]
-            for an in GAME_AREA_NAMES
+            channel_count += len(blends)
+
+        # Volume of each blend for an area, by whole danger level
+        self.__volume_tables = {
+            an: self.volume_table(len(blends))
+            for an, blends in self.game_area_blends.items()
             }
 
+        # The volumes currently set on the area blends
+        self.__cur_volumes = np.array([])
+
         # Name of area being played, or None if silence
         self.__area = None
 
+        # Blends of the area being played, and the channels they play on
+        self.__cur_area_blends = []
+        self.__cur_area_channels = []
+
         # Current danger level
         self.__danger_level = 0
 
-    def load_trimmed(self, fn, an):
-        """Load an audio into PyGame after trimming it as needed,
-            or load the pre-trimmed version.
+    def load_blend(self, an, k):
+        """Load one of an area's pre-trimmed blends into PyGame
 
         Args:
-            fn (str): The filename to load.
-            an (str): The area name that this file belongs to.
+            an (str): The area name.
+            k (int): How many tracks above the base one are mixed in.
 
         Returns:
             music (pygame.mixer.Sound): The loopable music sound.
         """
 
-        # Paths for where the trimmed and un-trimmed versions should be
-        pre_trimmed_path = os.path.join(PRE_TRIMMED_FOLDER, fn)
-        untrimmed_path = os.path.join(OST_PATH, fn)
+        if CACHE_FORMAT == "npy":
+            # Map the samples in, so the OS only pages them in as PyGame copies
+            pcm = np.load(_pre_blended_path(an, k), mmap_mode="r")
 
-        # If we do not already have a trimmed version, create it
-        if not PRE_TRIMMED:
-            print("Performing trim on", fn)
-            # Load the audio into PyDub
-            pds = pydub.AudioSegment.from_file(untrimmed_path)
-
-            # Trim off the silence for the area
-            pds = pds[TRIM_VALUES[an][0] * 1000: -TRIM_VALUES[an][1] * 1000]
+        else:
+            # Read the samples straight into a preallocated buffer
+            with sf.SoundFile(_pre_blended_path(an, k)) as f:
+                pcm = np.empty((f.frames, f.channels), dtype=np.int16)
+                f.read(out=pcm)
 
-            # Save the trimmed audio to the pre-trimmed location
-            os.makedirs(PRE_TRIMMED_FOLDER, exist_ok = True)
-            pds.export(pre_trimmed_path)
+        # Load the samples into PyGame
+        return _make_sound(pcm)
 
-        # Load the file into PyGame
-        s = mixer.Sound(pre_trimmed_path)
+    @staticmethod
+    def volume_table(blend_count):
+        """Calculate the volumes of an area's blends at every whole danger level
 
-        print("Loaded", fn)
+        Args:
+            blend_count (int): How many blends the area has.
 
-        return s
+        Returns:
+            table (numpy.ndarray): The volumes, with a row for each danger
+                level and a column for each blend.
+        """
 
-    @property
-    def cur_area_tracks(self):
-        """Tracks for the current area"""
+        # The combined volumes of all the tracks above the base one,
+        # should be between 0 and 3
+        vol_to_spread = np.arange(MAX_DANGER_LEVEL + 1) / MAX_DANGER_LEVEL * (blend_count - 1)
 
-        if not self.area:
-            return []
+        # Crossfade between the two blends on either side, which sounds the
+        # same as fading in the next track by itself. The blends already
+        # have MAX_AUDIO_VOL mixed in.
+        distance = np.abs(vol_to_spread[:, np.newaxis] - np.arange(blend_count))
+        return np.clip(1 - distance, 0, 1)
 
-        return self.game_area_tracks[self.area]
+    @property
+    def cur_area_blends(self):
+        """Blends for the current area"""
+        return self.__cur_area_blends
 
     @property
     def area(self):
@@ -146,50 +658,72 @@ class AreaMusicPlayer:
     @area.setter
     def area(self, new):
         """The current area to play the music of, set to None to stop"""
-        # Stop the current music
-        for track in self.cur_area_tracks:
-            track.stop()
+        # Keep playing the area's music where it is, rather than restarting it
+        if new == self.__area:
+            return
+
+        # Fade out the current music, rather than cutting it off
+        for channel in self.__cur_area_channels:
+            channel.fadeout(FADE_MS)
 
         # All we had to do was stop the music
         if new is None:
             self.__area = None
+            self.__cur_area_blends = []
+            self.__cur_area_channels = []
             return
 
         assert new in GAME_AREA_NAMES, "Invalid area setting"
 
         self.__area = new
+        self.__cur_area_blends = self.game_area_blends[new]
+        self.__cur_area_channels = self.__area_channels[new]
 
+        # The new blends have not had any volume set on them yet
+        self.__cur_volumes = np.full(len(self.__cur_area_blends), np.nan)
         self.__update_music_volumes()
 
-        for track in self.cur_area_tracks:
-            track.play(-1)
+        # Fade in over the old music, with the volumes already set. All the
+        # blends play together, since PyGame cannot start one partway through
+        # to keep it in time. Silent ones cost SDL next to nothing to mix.
+        for channel, blend in zip(self.__cur_area_channels, self.__cur_area_blends):
+            channel.play(blend, -1, fade_ms=FADE_MS)
 
     @property
     def danger_level(self):
-        """The current danger level"""
+        """The current danger level, rounded to a whole step"""
         return self.__danger_level
 
     @danger_level.setter
     def danger_level(self, new):
-        """The current danger level"""
+        """The current danger level, rounded to a whole step"""
         assert 0 <= new <= MAX_DANGER_LEVEL, "Invalid danger level setting"
+        new = round(new)
+
+        # Too small of a change to be heard
+        if new == self.__danger_level:
+            return
+
         self.__danger_level = new
         self.__update_music_volumes()
 
     def __update_music_volumes(self):
         """Update the  area music volumes based off of our current danger level"""
         # No area currently loaded, so no volume changes needed
-        if not self.area:
+        if not self.__area:
             return
 
-        # The combined volumes of all the tracks above the base one,
-        # should be between 0 and 3
-        vol_to_spread = (self.danger_level / MAX_DANGER_LEVEL) * len(self.cur_area_tracks[1:])
+        volumes = self.__volume_tables[self.__area][self.__danger_level]
 
-        # For each track, set the volume appropriately
-        self.cur_area_tracks[0].set_volume(MAX_AUDIO_VOL)
-        for i, track in enumerate(self.cur_area_tracks[1:]):
-            track.set_volume(min((max((vol_to_spread - i, 0)), 1)) * MAX_AUDIO_VOL)
+        # Only touch the blends whose volume actually changed. This goes on
+        # the blends rather than their channels, since SDL fades take over
+        # the channel volume and put it back afterwards.
+        changes = zip(self.__cur_area_blends, volumes, self.__cur_volumes)
+        for blend, volume, cur_volume in changes:
+            if volume != cur_volume:
+                blend.set_volume(volume)
+
+        self.__cur_volumes = volumes
 
 
 class MainWindow(tk.Tk):
@@ -201,7 +735,11 @@ class MainWindow(tk.Tk):
         self.title("Solar Rift Area Music Player")
         self.geometry("300x100")
         self.player = AreaMusicPlayer()
-        print("Starting GUI")
+
+        # Latest danger level from the slider, waiting to go to the player
+        self.pending_danger_level = None
+
+        log.debug("Starting GUI")
         self.build()
         self.mainloop()
 
@@ -245,8 +783,22 @@ class MainWindow(tk.Tk):
 
     def update_danger_level(self, new):
         """The selected danger level has been updated"""
-        self.player.danger_level = float(new)
+        # Slider drags fire this a lot, so pass on only the latest value once
+        # the GUI is idle
+        if self.pending_danger_level is None:
+            self.after_idle(self.flush_danger_level)
+
+        self.pending_danger_level = float(new)
+
+    def flush_danger_level(self):
+        """Pass the latest selected danger level on to the player"""
+        self.player.danger_level = self.pending_danger_level
+        self.pending_danger_level = None
+
+if __name__ == "__main__":
+    # Lets the trimming worker processes start inside the exe
+    multiprocessing.freeze_support()
 
-MainWindow()
-mixer.quit()
-print("Exit. S.D.G.")
+    MainWindow()
+    mixer.quit()
+    log.info("Exit. S.D.G.")